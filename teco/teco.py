@@ -13,10 +13,9 @@ import os
 import sys
 import re
 import time
-import traceback
+import operator
 import glob
 import warnings
-import copy
 import atexit
 import threading
 import tempfile
@@ -55,11 +54,63 @@ esc   = '\033'
 rub   = '\177'
 eol   =  lf + vt + ff          # all these are TECO end of line (TODO)
 
+# Arithmetic operators, indexed by the operator command character.
+# The sign operators are also legal as unary operators.
+arithops = { '+' : operator.add,
+             '-' : operator.sub,
+             '*' : operator.mul,
+             '/' : operator.floordiv,
+             '&' : operator.and_,
+             '#' : operator.or_ }
+signops = frozenset ("+-")
+
+# Value of each digit command character
+_digitval = { c : n for n, c in enumerate ("0123456789") }
+
+# Make a " test for a character class.  "method" is the str method
+# that tests for the class, and "extra" gives any other characters
+# that belong to it.  ASCII codes, by far the common case, are looked
+# up in a precomputed set rather than converted to a string and tested.
+def _chartest (method, extra = ""):
+    ascii = frozenset (n for n in range (128)
+                       if method (chr (n)) or chr (n) in extra)
+    def test (n):
+        if 0 <= n < 128:
+            return n in ascii
+        return 128 <= n < 0x110000 and method (chr (n))
+    return test
+
+# Tests for the " (conditional) command, indexed by the condition
+# character.  Each is given the numeric argument.
+condtests = { c : test for chars, test in (
+    ("a",    _chartest (str.isalpha)),
+    ("c",    _chartest (str.isalnum, "$._")),
+    ("d",    _chartest (str.isdigit)),
+    ("efu=", lambda n: n == 0),
+    ("g>",   lambda n: n > 0),
+    ("lst<", lambda n: n < 0),
+    ("n",    lambda n: n != 0),
+    ("r",    _chartest (str.isalnum)),
+    ("v",    _chartest (str.islower)),
+    ("w",    _chartest (str.isupper))) for c in chars }
+
 # global variables
 screen = None
 display = None
 dsem = None
 exiting = False
+lasttime = None, None
+
+def localtime ():
+    """Return time.localtime () for the current time.  The converted
+    time is kept, and only redone when the second changes, so ^B and
+    ^H done in a loop don't convert the same time over and over.
+    """
+    global lasttime
+    now = int (time.time ())
+    if now != lasttime[0]:
+        lasttime = now, time.localtime (now)
+    return lasttime[1]
 
 # Other useful constants
 VERSION = 40
@@ -98,7 +149,10 @@ except ImportError:
         return ch
 
 # Enhanced traceback, from Python Cookbook section 8.6, slightly tweaked
+# Set exclocals to False to get just the traceback, without the
+# listing of local variables.
 maxstrlen = 200
+exclocals = True
 def print_exc_plus ():
     '''Print all the usual traceback information, followed by a listing of
     all the local variables in each frame.
@@ -106,6 +160,13 @@ def print_exc_plus ():
     Variable values are truncated to 200 characters max for readability,
     and converted to printable characters in standard TECO fashion.
     '''
+    # traceback is imported here since it is only needed when
+    # something has gone badly wrong.
+    import traceback
+    endwin ()
+    traceback.print_exc ()
+    if not exclocals:
+        return
     tb = sys.exc_info ()[2]
     while tb.tb_next:
         tb = tb.tb_next
@@ -115,8 +176,6 @@ def print_exc_plus ():
         stack.append (f)
         f = f.f_back
     stack.reverse ()
-    endwin ()
-    traceback.print_exc ()
     print("Locals by frame, innermost last")
     if stack[0].f_code.co_name == "?":
         del stack[0]
@@ -126,36 +185,46 @@ def print_exc_plus ():
                                              frame.f_code.co_filename,
                                              frame.f_lineno))
         for key, value in list(frame.f_locals.items ()):
-            print("\t%20s = " % key, end=' ')
+            # Truncate before converting, so a huge value (like the
+            # text buffer) isn't converted in full just to print
+            # the start of it.
             try:
-                value = printable (str (value))
+                value = str (value)
                 if len (value) > maxstrlen:
                     value = value[:maxstrlen] + "..."
-                print(value)
+                value = printable (value)
             except:
-                print("<ERROR while printing value>")
+                value = "<ERROR while printing value>"
+            print("\t%20s =  %s" % (key, value))
                 
 # Transform a generic binary string to a printable one.  Try to
 # optimize this because sometimes it is fed big strings.
-# tab through cr are printed as is; other control chars are uparrowed
-# except for esc of course.
-# Taken from Python Cookbook, section 1.18
-_printre = re.compile ("[\000-\007\016-\037\177]")
-_printdict = { }
+# bs through cr are printed as is; other control chars are uparrowed
+# except for esc of course.  The translation table says what each
+# of those turns into.
+_printtab = { }
 for c in range (0o40):
-    _printdict[chr (c)] = '^' + chr (c + 64)
-_printdict[esc] = '$'
-_printdict[rub] = "^?"
-
-def _makeprintable (m):
-    return _printdict[m.group (0)]
+    if not 0o10 <= c <= 0o15:
+        _printtab[c] = '^' + chr (c + 64)
+_printtab[ord (esc)] = '$'
+_printtab[ord (rub)] = "^?"
+_unprintable = frozenset (chr (c) for c in _printtab)
+# str.translate only has a fast path for ASCII strings; for others it
+# is many times slower than substituting just the characters that
+# need it.
+_printre = re.compile ("[%s]" % "".join (map (re.escape, _unprintable)))
+
+def _printrep (m):
+    return _printtab[ord (m.group ())]
 
 def printable(s):
     """Convert the supplied string to a printable string,
     by converting all unusual control characters to uparrow
     form, and escape to $ sign.
     """
-    return _printre.sub (_makeprintable, s)
+    if s.isascii ():
+        return s.translate (_printtab)
+    return _printre.sub (_printrep, s)
 
 # Error handling
 class err (Exception):
@@ -167,22 +236,41 @@ class err (Exception):
     '''
     def __init__ (self, teco, *a):
         self.teco = teco
-        self.args = tuple (printable (arg) for arg in a)
+        if a:
+            # Single character arguments (the usual case) that need
+            # no conversion are used as is.
+            self.args = tuple ([ arg if len (arg) == 1 and
+                                 arg not in _unprintable
+                                 else printable (arg)
+                                 for arg in map (str, a) ])
+        else:
+            self.args = ()
         teco.clearargs ()
         
+    def __init_subclass__ (cls):
+        # Set up the message formatter when the error class is defined,
+        # so only messages that take an argument are run through the
+        # % operator.
+        msg = cls.__doc__
+        if "%s" in msg:
+            cls.msgfmt = staticmethod (msg.__mod__)
+        else:
+            cls.msgfmt = staticmethod (lambda args: msg)
+        
     def show (self):
         endwin ()
         detail = self.teco.eh & 3
         if detail == 1:
-            print("?%s" % self.__class__.__name__)
+            out = "?%s" % self.__class__.__name__
         else:
             if self.args:
-                msg = self.__class__.__doc__ % self.args
+                msg = self.msgfmt (self.args)
             else:
                 msg = self.__class__.__doc__
-            print("?%s   %s" % (self.__class__.__name__, msg))
+            out = "?%s   %s" % (self.__class__.__name__, msg)
         if self.teco.eh & 4:
-            print(printable (self.teco.failedcommand ()), "?")
+            out += "\n%s ?" % printable (self.teco.failedcommand ())
+        print(out)
 
 class ARG (err): 'Improper Arguments'
 class BNI (err): '> not in iteration'
@@ -238,16 +326,22 @@ class ExitLevel (Exception): pass
 class ExitExecution (Exception): pass
 
 # text reformatting for screen display
-tabre = re.compile (tab)
-_tabadjust = 0
-def _untabify (m):
-    global _curcol, _tabadjust
-    pos = m.start () + _tabadjust
-    count = 8 - (pos & 7)
-    if _curcol > pos:
-        _curcol += count - 1
-    _tabadjust += count - 1
-    return " " * count
+def _untabify (line, curcol):
+    """Expand tabs in the line, counting every other character as
+    one column.  Returns the expanded line and the cursor column
+    adjusted for the tabs in front of it.
+    """
+    parts = line.split (tab)
+    col = len (parts[0])
+    ret = [ parts[0] ]
+    for part in parts[1:]:
+        count = 8 - (col & 7)
+        if curcol > col:
+            curcol += count - 1
+        ret.append (" " * count)
+        ret.append (part)
+        col += count + len (part)
+    return "".join (ret), curcol
 
 def untabify (line, curpos, width):
     """Convert tabs to spaces, and wrap the line as needed into chunks
@@ -262,32 +356,41 @@ def untabify (line, curpos, width):
     
     Note that a trailing cr and/or lf is stripped from the input line.
     """
-    global _curcol, _tabadjust
-    _curcol = curpos
-    _tabadjust = 0
-    line = tabre.sub (_untabify, printable (line.rstrip (crlf)))
+    line = line.rstrip (crlf)
+    if line.isprintable ():
+        # The common case: no tabs or control characters, so
+        # the text and the cursor column are used as is.
+        curcol = curpos
+    elif cr in line:
+        # expandtabs restarts the tab stops after a CR, but on the
+        # screen a bare CR is one column wide, so walk the tabs here.
+        line, curcol = _untabify (printable (line), curpos)
+    else:
+        line = printable (line)
+        # The cursor column is the width of the expanded text in front
+        # of it.  If dot is beyond the stripped text (between CR and LF)
+        # it stays that far beyond the end.
+        curcol = len (line[:curpos].expandtabs (8)) + \
+                 max (curpos - len (line), 0)
+        line = line.expandtabs (8)
     currow = 0
     if True:            # todo: truncate vs. wrap mode
-        lines = [ ]
-        while len (line) > width:
-            lines.append ((line[:width], True))
-            line = line[width:]
-            if _curcol > width:
-                currow += 1
-                _curcol -= width
-        lines.append ((line, False))
-    return lines, currow, _curcol
+        lines = [ (line[i:i + width], True)
+                  for i in range (0, len (line) - width, width) ]
+        if curcol > width:
+            currow = min ((curcol - 1) // width, len (lines))
+            curcol -= currow * width
+        lines.append ((line[len (lines) * width:], False))
+    return lines, currow, curcol
     
 # Property makers
 def commonprop (name, doc=None):
     """Define a property that references an attribute of 'teco'
     (the common state object for TECO).
     """
-    def _fget (obj):
-        return getattr (obj.teco, name)
+    _fget = operator.attrgetter ("teco." + name)
     def _fset (obj, val):
         return setattr (obj.teco, name, val)
-    _fget.__name__ = "get_%s" % name
     _fset.__name__ = "set_%s" % name
     return property (_fget, _fset, doc=doc)
 
@@ -295,11 +398,9 @@ def bufprop (name, doc=None):
     """Define a property that references an attribute of 'buffer'
     (the text buffer object for TECO).
     """
-    def _fget (obj):
-        return getattr (obj.buffer, name)
+    _fget = operator.attrgetter ("buffer." + name)
     def _fset (obj, val):
         return setattr (obj.buffer, name, val)
-    _fget.__name__ = "get_%s" % name
     _fset.__name__ = "set_%s" % name
     return property (_fget, _fset, doc=doc)
 
@@ -332,8 +433,9 @@ class teco (object):
         self.lastfilename = ""
         self.qstack = [ ]
         self.clearargs ()
-        self.interactive = command_level (self)
+        # The buffer comes first; command levels keep a reference to it.
         self.buffer = buffer (self)
+        self.interactive = command_level (self)
         self.cmdhandler = command_handler (self)
         self.screenok = False
         self.incurses = False
@@ -348,25 +450,15 @@ class teco (object):
         """Process a pending arithmetic operation, if any.
         self.arg is left with the current term value.
         """
-        if self.op:
-            if self.op in '+-' and self.arg is None:
+        op = self.op
+        if op:
+            if op in signops and self.arg is None:
                 self.arg = 0
             if self.num is None:
                 raise ILL (self, c)
-            if self.op == '+':
-                self.arg += self.num
-            elif self.op == '-':
-                self.arg -= self.num
-            elif self.op == '*':
-                self.arg *= self.num
-            elif self.op == '/':
-                if not self.num:
-                    raise ILL (self, '/')
-                self.arg //= self.num
-            elif self.op == '&':
-                self.arg &= self.num
-            elif self.op == '#':
-                self.arg |= self.num
+            if op == '/' and not self.num:
+                raise ILL (self, '/')
+            self.arg = arithops[op] (self.arg, self.num)
         else:
             self.arg = self.num
         
@@ -407,7 +499,7 @@ class teco (object):
         """Process an arithmetic operation character.
         """
         if self.num is None:
-            if c in "+-" and self.arg is None:
+            if c in signops and self.arg is None:
                 self.op = c
                 return
             else:
@@ -420,12 +512,10 @@ class teco (object):
         """Process a decimal digit.  8 and 9 generate an error if
         the current radix is octal.
         """
-        if self.num is None:
-            self.num = 0
-        n = int (c)
+        n = _digitval[c]
         if n >= self.radix:
             raise ILN (self)
-        self.num = self.num * self.radix + n
+        self.num = (self.num or 0) * self.radix + n
 
     def getarg (self, c):
         """Get a complete argument, or None if there isn't one.
@@ -435,7 +525,7 @@ class teco (object):
         """
         if self.opstack:
             raise MRP (self)
-        if self.op and self.op in '+-' and self.num is None and self.arg is None:
+        if self.op in signops and self.num is None and self.arg is None:
             self.num = 1
         return self.getterm (c)
 
@@ -446,7 +536,7 @@ class teco (object):
         a value if not.  This way, the second case can be used as
         an element of an expression.
         """
-        if self.op and self.op in '+-' and self.num is None and self.arg is None:
+        if self.op in signops and self.num is None and self.arg is None:
             self.num = 1
         if self.num is None:
             return None
@@ -603,8 +693,14 @@ class teco (object):
     def runcommand (self, s):
         """Execute the specified TECO command string as an interactive
         level command.
+
+        The commands that produce output don't flush it, so that is
+        done here once the command string is finished.
         """
-        self.interactive.run (s)
+        try:
+            self.interactive.run (s)
+        finally:
+            sys.stdout.flush ()
 
     def screentext (self, height, width, curlinenum):
         """Given a screen height and width in characters, and the
@@ -619,32 +715,38 @@ class teco (object):
         i.e., it does not end with a carriage return, and False if
         it is the end of the line.
         """
+        buf = self.buf
+        bufend = len (buf)
         curlinestart = self.buffer.line (0)
         curcol = self.dot - curlinestart
-        line = self.buf[curlinestart:self.buffer.line(1)]
+        start = self.buffer.line (1)
+        line = buf[curlinestart:start]
         lines, currow, curcol = untabify (line, curcol, width)
-        n = 1
         # First add on lines after the current line, up to the
-        # window height, if we have that many
-        while len (lines) < height:
-            start, end = self.buffer.line (n), self.buffer.line (n + 1)
-            if start >= self.end:
-                break
-            line, i, i = untabify (self.buf[start:end], 0, width)
+        # window height, if we have that many.  Each line boundary
+        # is found by scanning on from the previous one, rather than
+        # counting lines from dot all over again.
+        while len (lines) < height and start < bufend:
+            end = buf.find (lf, start) + 1 or bufend
+            line, i, i = untabify (buf[start:end], 0, width)
             lines += line
-            n += 1
+            start = end
         # Next, add lines before the current line, until we have
         # enough to put the cursor onto the line where we want it,
-        # but also try to fill the screen
-        n = 0
-        while currow < curlinenum or len (lines) < height:
-            start, end = self.buffer.line (-n - 1), self.buffer.line (-n)
-            if not end:
-                break
-            line, i, i = untabify (self.buf[start:end], 0, width)
-            lines = line + lines
+        # but also try to fill the screen.  These are collected
+        # last line first, and put in front of the rest at the end.
+        before = [ ]
+        end = curlinestart
+        while end and (currow < curlinenum or
+                       len (before) + len (lines) < height):
+            start = buf.rfind (lf, 0, end - 1) + 1
+            line, i, i = untabify (buf[start:end], 0, width)
+            before.extend (reversed (line))
             currow += len (line)
-            n += 1
+            end = start
+        if before:
+            before.reverse ()
+            lines = before + lines
         # Now trim things, since (a) the topmost line may have wrapped
         # so the cursor may be lower than we want it to be, and (b)
         # we now probably have more lines than we want at the end
@@ -683,6 +785,8 @@ class teco (object):
         """
         if not cursespresent:
             return
+        # Send any pending output before curses takes over the screen
+        sys.stdout.flush ()
         self.enable_curses ()
         curlinenum = self.curline
         width, height = self.watchparams[1], self.watchparams[2]
@@ -693,14 +797,17 @@ class teco (object):
             curcol = width - 1
         for row, line in enumerate (lines):
             line, wrap = line
-            screen.addstr (row, 0, line)
+            screen.addnstr (row, 0, line, width)
             screen.clrtoeol ()
         screen.clrtobot ()
         if not self.screenok:
             screen.clearok (1)
             self.screenok = True
         screen.move (currow, curcol)
-        screen.refresh ()
+        # Stage the window contents, then send the changes to the
+        # terminal in one update.
+        screen.noutrefresh ()
+        curses.doupdate ()
         
     # Interface to the display thread
     def startdisplay (self):
@@ -735,46 +842,74 @@ class teco (object):
             if flag == -1:
                 flag = 0
             ch = flag & 255
+            flag >>= 8
+            start = self.buffer.line (-flag)
+            end = self.buffer.line (flag + 1)
+            buf = self.buf
             if ch:
                 if ch < 32:
                     ch = lf
                 else:
                     ch = chr (ch)
-            flag >>= 8
-            start = self.buffer.line (-flag)
-            end = self.buffer.line (flag + 1)
-            sys.stdout.write (printable (self.buf[start:self.dot]))
-            if ch:
-                sys.stdout.write (ch)
-            sys.stdout.write (printable (self.buf[self.dot:end]))            
-            sys.stdout.flush ()
+                # The marker character is shown as is, so only the
+                # text on either side of it is made printable.
+                text = printable (buf[start:self.dot]) + ch + \
+                       printable (buf[self.dot:end])
+            else:
+                text = printable (buf[start:end])
+            # No flush here; the main loop flushes before it reads
+            # the next command.
+            sys.stdout.write (text)
             self.screenok = False
 
 # A metaclass to allow non-alphanumeric methods to be defined, which
 # is handy when you use method names directly for command character
 # processing.  Inspired by the Python Cookbook, chapter 20 intro.
+# It also collects the command methods into a "commands" table, which
+# command_level.do uses to dispatch.
+_charre = re.compile ("char([0-7]{3})")
 def _repchar (m):
     return chr (int (m.group (1), 8))
 class Anychar (type):
     def __new__ (cls, cname, cbases, cdict):
         newnames = {}
-        charre = re.compile ("char([0-7]{3})")
         for name in cdict:
-            newname, cnt = charre.subn (_repchar, name)
+            newname, cnt = _charre.subn (_repchar, name)
             if cnt:
                 fun = cdict[name]
                 newnames[newname] = fun
         cdict.update (newnames)
+        # Table of command handlers, for dispatch without getattr:
+        # all the one-character names, and the two-character names
+        # of E and F commands.
+        cdict["commands"] = { name : fun for name, fun in cdict.items ()
+                              if len (name) == 1 or
+                              (len (name) == 2 and name[0] in "ef") }
         return super (Anychar, cls).__new__ (cls, cname, cbases, cdict)
 
 class qreg (object):
     '''Queue register object.  Stores text and numeric parts, with
     methods to access each part.
+
+    The text part is kept as a list of pieces that is joined only when
+    the text is asked for, so repeated appends (as done by :X and :^U
+    in a loop) don't copy the whole text each time.
     '''
+    __slots__ = ("num", "chunks")
+    
     def __init__ (self):
         self.num = 0
-        self.text = ""
-
+        self.chunks = [ ]
+
+    def copy (self):
+        # The chunk list is mutable, so the copy needs its own
+        q = qreg ()
+        q.num = self.num
+        q.chunks = self.chunks[:]
+        return q
+    
+    # The numeric part is simply the "num" attribute, which the
+    # command handlers use directly.
     def getnum (self):
         return self.num
 
@@ -782,13 +917,18 @@ class qreg (object):
         self.num = val
 
     def getstr (self):
-        return self.text
+        chunks = self.chunks
+        if len (chunks) == 1:
+            return chunks[0]
+        text = "".join (chunks)
+        self.chunks = [ text ]
+        return text
 
     def setstr (self, val):
-        self.text = val
+        self.chunks = [ val ]
 
     def appendstr (self, val):
-        self.text += val
+        self.chunks.append (val)
 
 # Atexit handlers.  These are guarded so they can be called even
 # if the corresponding module isn't present.
@@ -865,9 +1005,13 @@ if wxpresent:
             the display to go hide itself.
             """
             if self.running:
-                self.frame.doShow = show
-                self.frame.doRefresh = True
-                wx.WakeUpIdle ()
+                frame = self.frame
+                frame.doShow = show
+                # Only one refresh needs to be pending at a time; it
+                # picks up whatever the buffer state is when it runs.
+                if not frame.doRefresh:
+                    frame.doRefresh = True
+                    wx.CallAfter (frame.DoRefresh)
     
         def stop (self):
             """Stop the display thread by closing the Frame.
@@ -898,48 +1042,57 @@ if wxpresent:
             self.Bind (wx.EVT_PAINT, self.OnPaint)
             self.Bind (wx.EVT_CLOSE, self.OnClose)
             self.Bind (wx.EVT_TIMER, self.OnTimer)
-            self.Bind (wx.EVT_IDLE, self.OnIdle)
             self.display = display
             self.cursor = None, None, False
             self.timer = wx.Timer (self, timerId)
             self.timer.Start (500)
             self.cursorState = True
             self.doRefresh = False
-            self.SetBackgroundColour (wx.WHITE)
+            self.lastpaint = None
+            # OnPaint fills in the whole window, so there is no need
+            # for a separate background erase.
+            self.SetBackgroundStyle (wx.BG_STYLE_PAINT)
             
-        def OnIdle (self, event = None):
-            """Used to make a refresh happen, if one has been requested.
+        def DoRefresh (self):
+            """Carry out a refresh requested by displayApp.show.
+            This runs in the display thread, via wx.CallAfter.
             """
-            if self.doRefresh:
-                self.doRefresh = False
-                self.Show (self.doShow)
-                if self.doShow:
-                    self.Refresh ()
+            self.doRefresh = False
+            self.Show (self.doShow)
+            if self.doShow:
+                self.Refresh ()
                 
         def OnTimer (self, event = None):
+            """Blink the cursor, by flipping its state and repainting
+            just the part of the window where it is drawn.
+            """
+            x, y, flip = self.cursor
+            if x is not None and self.IsShownOnScreen ():
+                cw, ch = self.display.fontextent
+                self.cursorState = not self.cursorState
+                self.RefreshRect (wx.Rect (x - cw // 2, y - ch,
+                                           cw + 2, ch + 1))
+
+        def DrawCursor (self, dc):
             """Draw a GT40-TECO style cursor: vertical line with
             a narrow horizontal line across the bottom, essentially
             an upside-down T.
 
             If dot is between a CR and LF, the cursor is drawn upside
             down (right side up T) at the left margin.
+
+            Nothing is drawn in the "off" phase of the blink.
             """
             x, y, flip = self.cursor
-            if x is not None:
-                cw, ch = self.display.fontextent
-                if self.cursorState:
-                    pen = wx.BLACK_PEN
-                else:
-                    pen = wx.WHITE_PEN
-                self.cursorState = not self.cursorState
-                dc = wx.ClientDC (self)
-                dc.SetPen (pen)
-                if flip:
-                    dc.DrawLine (x, y, x, y - ch)
-                    dc.DrawLine (x - cw / 2, y - ch, x + cw / 2 + 1, y - ch)
-                else:
-                    dc.DrawLine (x, y, x, y - ch)
-                    dc.DrawLine (x - cw / 2, y, x + cw / 2 + 1, y)
+            if x is None or not self.cursorState:
+                return
+            cw, ch = self.display.fontextent
+            dc.SetPen (wx.BLACK_PEN)
+            dc.DrawLine (x, y, x, y - ch)
+            if flip:
+                dc.DrawLine (x - cw // 2, y - ch, x + cw // 2 + 1, y - ch)
+            else:
+                dc.DrawLine (x - cw // 2, y, x + cw // 2 + 1, y)
                 
         def OnPaint (self, event = None):
             """This is the event handler for window repaint events,
@@ -949,7 +1102,11 @@ if wxpresent:
             Line wrap is indicated in GT40 fashion: the continuation line
             segments have a right-pointing arrow in the left margin.
             """
-            dc = wx.PaintDC (self)
+            # Draw into an off-screen buffer (where the platform doesn't
+            # already double buffer) which is then copied to the window
+            # in one go, to avoid flicker.
+            dc = wx.AutoBufferedPaintDC (self)
+            dc.SetBackground (wx.WHITE_BRUSH)
             dc.Clear ()
             dc.SetFont (self.display.font)
             w, h = dc.GetSize ()
@@ -958,7 +1115,18 @@ if wxpresent:
             cw, ch = self.display.fontextent
             w //= cw
             h //= ch
-            lines, currow, curcol = self.display.teco.screentext (h, w, h // 2)
+            # Reflowing the buffer is only needed if the window size,
+            # the text, or dot has changed since the last repaint; the
+            # cursor blink and window exposure repaints don't need it.
+            # The buffer text is an immutable string, so it can be
+            # kept as part of the key.
+            t = self.display.teco
+            key = w, h, t.buf, t.dot
+            if self.lastpaint and self.lastpaint[0] == key:
+                lines, currow, curcol = self.lastpaint[1]
+            else:
+                lines, currow, curcol = t.screentext (h, w, h // 2)
+                self.lastpaint = key, (lines, currow, curcol)
             if curcol > len (lines[currow][0]):
                 self.cursor = self.display.margin, \
                               (currow + 2) * ch + self.display.margin, \
@@ -979,12 +1147,14 @@ if wxpresent:
                                     wx.Point (cw / 2, y2 + cw / 3 + 1)])
                 line, wrap = line
                 dc.DrawText (line, self.display.margin, y)
+            self.DrawCursor (dc)
     
         def OnClose (self, event = None):
             """Close the GT40 window, and stop the cursor blink timer.
             """
             self.timer.Stop ()
             self.cursor = None, None
+            self.lastpaint = None
             self.Destroy ()
             
 # Nice hairy regexp for scanning across bracketed constructs looking
@@ -1058,18 +1228,38 @@ iterset = "<>"
 condset = "\"|\'<>"
 tagset = "!<>"
 
-# Construct the three patterns
-iterpat = basepat.replace (marker, exclpat + dqpat).replace ('~', iterset)
-condpat = basepat.replace (marker, exclpat).replace ('~', condset)
-tagpat  = basepat.replace ("!", "").replace (marker, dqpat).replace ('~', tagset)
+# Since Python 3.11, the outer repeat can be made possessive.  Nothing
+# follows it in the pattern, so the match is the same, but the matcher
+# no longer keeps backtracking state for every construct it skips.
+# That makes scanning across a long range several times faster.
+if sys.version_info >= (3, 11):
+    basepat = basepat.rstrip () + "+"
 
-iterre = re.compile (iterpat, re.IGNORECASE | re.DOTALL | re.VERBOSE)
-condre = re.compile (condpat, re.IGNORECASE | re.DOTALL | re.VERBOSE)
-tagre  = re.compile (tagpat,  re.IGNORECASE | re.DOTALL | re.VERBOSE)
+_skipsub = re.compile (re.escape (marker) + "|~")
+
+def _skipre (insert, terms, tags = True):
+    """Build one of the scan patterns from basepat: the marker is
+    replaced by "insert" and the tilde by the terminator set "terms",
+    both in a single substitution pass.  If "tags" is False, the !
+    is removed so tags are not skipped.
+    """
+    pat = basepat if tags else basepat.replace ("!", "")
+    subs = { marker : insert, "~" : terms }
+    pat = _skipsub.sub (lambda m: subs[m.group ()], pat)
+    return re.compile (pat, re.IGNORECASE | re.DOTALL | re.VERBOSE)
+
+# Construct the three patterns
+iterre = _skipre (exclpat + dqpat, iterset)
+condre = _skipre (exclpat, condset)
+tagre  = _skipre (dqpat, tagset, False)
 
 class iter (object):
     '''State for command iterations.
     '''
+    # One of these is made for every iteration entered, and "again" is
+    # run for every pass through it, so use slots for the attributes.
+    __slots__ = ("start", "count", "cmd", "teco")
+    
     def __init__ (self, teco, cmd, count):
         self.start = cmd.cmdpos
         self.count = count
@@ -1077,6 +1267,9 @@ class iter (object):
         self.teco = teco
 
     def again (self, atend = True, delta = 1):
+        # Output (including trace text) is not flushed by the commands
+        # that produce it; push it out once per pass through the loop.
+        sys.stdout.flush ()
         if self.count:
             self.count -= delta
             if not self.count:
@@ -1092,10 +1285,20 @@ class iter (object):
 
 # assorted regular expressions used below:
 
-# patterns for \ command, for the three possible radix values
-decre = re.compile (r'[+-]?\d+')
+# patterns for \ command, for the three possible radix values, and
+# the corresponding formats for converting the other way.  These are
+# ASCII digits only, as for the digit commands.
+decre = re.compile (r'[+-]?\d+', re.ASCII)
 octre = re.compile (r'[+-]?[0-7]+')
-hexre = re.compile (r'[+-]?[0-9a-f]+', re.IGNORECASE)
+hexre = re.compile (r'[+-]?[0-9a-f]+', re.IGNORECASE | re.ASCII)
+radixre = { 8 : octre, 10 : decre, 16 : hexre }
+radixfmt = { 8 : "%o", 10 : "%d", 16 : "%x" }
+
+# patterns for a run of digit commands, for the three possible radix
+# values.  Note that only 0-9 are digit commands, even in hex.
+digitruns = { 8  : re.compile ('[0-7]*'),
+              10 : re.compile ('[0-9]*'),
+              16 : re.compile ('[0-9]*') }
 
 # Patterns for the string builder, with and without ^x to control-x
 # conversion.  Note that a single replacer function is used with
@@ -1135,6 +1338,20 @@ _searchpat = re.compile ('''
                          (?:\005e(.+))
                          ''', re.IGNORECASE | re.DOTALL | re.VERBOSE)
 
+# The characters that can start a match of the patterns above.  A
+# string that contains none of them is returned unchanged by the
+# corresponding substitution, so the regexp pass can be skipped.
+_bldchars = frozenset ("^\021\022\005\026\027")
+_bldcharsnoup = _bldchars - { '^' }
+_searchchars = frozenset ("][\\^$.?+(){}\005\016\023\030")
+
+# Compiled search regexps, keyed by regexp string and flags, so a
+# search repeated in an iteration doesn't compile its regexp each time.
+# The key is the converted regexp rather than the TECO search string,
+# because ^EGq makes the conversion depend on Q-register contents.
+_searchcache = { }
+_searchcachemax = 256
+
 # Substitution dictionary for the special match characters
 #
 # These are regexp subexpressions corresponding to TECO match patterns
@@ -1154,6 +1371,143 @@ _searchdict5 = { ctrle + "a" : "A-Za-z",
                  ctrle + "w" : "A-Z",
                  ctrls       : "\\W"}
 
+# Search strings with none of these characters are plain text, both
+# to TECO and to the regexp engine
+_literalstop = _searchchars | set ("*|")
+
+# Search strings without ^E or ^N only have single character constructs
+# in them, so they can be converted with a translate table instead of
+# the substitution above.
+_searchmulti = frozenset (ctrle + "\016")
+_searchtrans = str.maketrans ({ c : "\\" + c for c in "][\\^$.?+(){}" })
+_searchtrans.update (str.maketrans ({ ctrlx : _searchdict2[ctrlx],
+                                      ctrls : "[%s]" % _searchdict5[ctrls] }))
+
+class literalmatch (object):
+    '''Match result from literalpat.  It has the start and end
+    methods of a regexp match object, which is all that the search
+    code uses.
+    '''
+    def __init__ (self, start, end):
+        self._start = start
+        self._end = end
+
+    def start (self):
+        return self._start
+
+    def end (self):
+        return self._end
+
+class literalpat (object):
+    '''Stand-in for a compiled regexp, used for case sensitive
+    searches for plain text.  These can use the string find methods,
+    which are a lot faster than the regexp engine.
+    '''
+    def __init__ (self, s):
+        self.pattern = s
+        
+    def match (self, buf, pos):
+        s = self.pattern
+        if buf.startswith (s, pos):
+            return literalmatch (pos, pos + len (s))
+        return None
+
+    def finditer (self, buf, pos):
+        s = self.pattern
+        n = len (s)
+        while True:
+            pos = buf.find (s, pos)
+            if pos < 0:
+                return
+            yield literalmatch (pos, pos + n)
+            pos += n
+
+    def rsearch (self, buf, pos, start, limit):
+        """Reverse search, as for the rsearch function below.
+        """
+        s = self.pattern
+        n = len (s)
+        e = pos + n
+        if limit:
+            e = min (e, limit)
+        pos = buf.rfind (s, start, e)
+        if pos < 0:
+            return None
+        return literalmatch (pos, pos + n)
+
+# Reverse searches.  There is no reverse search for regular expressions,
+# so instead the pattern is wrapped in a lookahead, with an empty named
+# group at the end.  That matches, with zero length, at every position
+# where the original pattern matches, and the group marks where that
+# match ends.  With finditer, all the match positions in a range are
+# then found in one pass of the regexp engine.  The range is moved
+# backwards from the search start, doubling in size each time, until
+# a match turns up.
+#
+# Each of those passes also scans the text after the range, up to the
+# next match or the end of the buffer.  So close to the search start
+# the pattern is instead matched at each position in turn, which does
+# not look at the text after it.  That is done over a stretch that
+# grows with the length of the text after the search start, and the
+# windows start out that size, so the repeated scans of that text
+# cost no more than scanning back to the match.
+_revcache = { }
+_revwindow = 256
+_revratio = 8
+
+def _revpat (pat):
+    """Return the lookahead form of compiled regexp "pat", or False
+    if it can't be made.
+    """
+    rpat = _revcache.get (pat)
+    if rpat is None:
+        if len (_revcache) >= _searchcachemax:
+            _revcache.clear ()
+        try:
+            rpat = re.compile ("(?=(?:%s)(?P<_end>))" % pat.pattern,
+                               pat.flags)
+        except re.error:
+            # This can happen for an ^EE pattern, for example one
+            # that uses inline flags.
+            rpat = False
+        _revcache[pat] = rpat
+    return rpat
+
+def rsearch (pat, buf, pos, start, limit):
+    """Search backwards for "pat" in "buf".  Returns the match that
+    starts closest to "pos" but not before "start", and that does not
+    end after "limit" if that is non-zero.  Returns None if there
+    is no such match.
+    """
+    start = max (start, 0)
+    if isinstance (pat, literalpat):
+        return pat.rsearch (buf, pos, start, limit)
+    rpat = _revpat (pat)
+    if rpat:
+        width = max (_revwindow, (len (buf) - pos) // _revratio)
+        lo = max (pos - width, start)
+    else:
+        # Do it the hard way all the way back.
+        lo = start
+    while pos >= lo:
+        m = pat.match (buf, pos)
+        if m and not (limit and m.end () > limit):
+            return m
+        pos -= 1
+    while pos >= start:
+        lo = max (pos - width, start)
+        found = None
+        for m in rpat.finditer (buf, lo):
+            if m.start () > pos:
+                break
+            if not (limit and m.end ("_end") > limit):
+                found = m
+        if found:
+            return literalmatch (found.start (), found.end ("_end"))
+        pos = lo - 1
+        width *= 2
+    return None
+            
 class command_level(metaclass=Anychar):
     '''This state handles a single command level (interactive or macro
     execution) for TECO.
@@ -1174,7 +1528,12 @@ class command_level(metaclass=Anychar):
     def __init__ (self, teco, q = None):
         self.qregs = q or { }
         self.teco = teco
-        self.enlist = [ ]
+        # The buffer object never changes, so keep it here as a plain
+        # attribute rather than a property.  That way the buffer
+        # properties below, which are used all over, only have one
+        # level of indirection.
+        self.buffer = teco.buffer
+        self.enlist = None
         self.enstring = ""
         self.iterstack = [ ]
         
@@ -1193,7 +1552,6 @@ class command_level(metaclass=Anychar):
     lastsearch = commonprop ("lastsearch")
     lastfilename = commonprop ("lastfilename")
     trace = commonprop ("trace")
-    buffer = commonprop ("buffer")
     screenok = commonprop ("screenok")
     
     # Now the ones that relate to the text buffer, so they are kept
@@ -1216,19 +1574,23 @@ class command_level(metaclass=Anychar):
         bound to a single method.
         """
         c = c.lower ()
-        try:
-            op = getattr (self, c)
-        except AttributeError:
+        op = self.commands.get (c)
+        if op is None:
             raise ILL (self.teco, c)
-        op (c)
+        op (self, c)
     
     def tracechar (self, c):
         """Show the supplied character (or string) as trace text,
         if tracing is enabled.
+
+        This is called for every command character, so the flag is
+        read straight from the common state rather than through the
+        "trace" property.  The output is not flushed here; that is
+        done for each pass of an iteration, and when the command
+        string is finished.
         """
-        if self.trace:
+        if self.teco.trace:
             sys.stdout.write (printable (c))
-            sys.stdout.flush ()
         
     def peeknextcmd (self):
         """Look at the next command character, without advancing
@@ -1243,17 +1605,20 @@ class command_level(metaclass=Anychar):
         """Get the next command character; if there isn't one,
         error UTC (Unterminated Command) is raised.
         """
-        c = self.peeknextcmd ()
-        if not c:
+        # This is done for every command character, so it does its
+        # own check rather than calling peeknextcmd.
+        pos = self.cmdpos
+        if pos >= len (self.command):
             raise UTC (self.teco)
+        c = self.command[pos]
         self.tracechar (c)
-        self.cmdpos += 1
+        self.cmdpos = pos + 1
         return c
 
     def colon (self):
         """Return True if colon modifier(s) are present.
         """
-        return self.colons != 0
+        return self.teco.colons != 0
     
     def getarg (self, c, default = None):
         '''Get the command argument.  If there is no argument, the
@@ -1346,17 +1711,22 @@ class command_level(metaclass=Anychar):
         is the delimiter.  Otherwise, the term argument specifies the
         delimiter, or ESC is used if term is omitted.
         """
-        if self.atmod:
+        # Nearly every string taking command comes through here, so
+        # the modifier flag is used directly rather than through the
+        # "atmod" property.
+        teco = self.teco
+        if teco.atmod:
             term = self.nextcmd ()
-            self.atmod = False
+            teco.atmod = False
+        cmd = self.command
         s = self.cmdpos
         try:
-            e = self.command.index (term, s)
+            e = cmd.index (term, s)
         except ValueError:
-            raise UTC (self.teco, c)
+            raise UTC (teco, c)
         self.cmdpos = e + 1
-        self.tracechar (self.command[s:self.cmdpos])
-        return self.command[s:e]
+        self.tracechar (cmd[s:e + 1])
+        return cmd[s:e]
 
     def strargs (self, c):
         """Return a pair of string arguments for the command.  If the at 
@@ -1379,25 +1749,26 @@ class command_level(metaclass=Anychar):
         else:
             raise IUC (self.teco, chr (n))
         
+    # Handlers for the string build constructs, indexed by the number
+    # of the _bldpat group that matched.  Each gets the group text.
+    _bldops = (None,
+               # ^Qx or ^Rx is literally x
+               lambda self, x: x,
+               # ^EQq is text of Q-reg q
+               lambda self, q: self.qregstr (q),
+               # ^EUq is character whose code is in numeric Q-reg q
+               lambda self, q: chr (self.qreg (q).getnum ()),
+               # ^Vx is lowercase x
+               lambda self, x: x.lower (),
+               # ^Wx is uppercase x
+               lambda self, x: x.upper (),
+               # ^x is control-x
+               lambda self, x: self.makecontrol (x))
+    
     def _strbuildrep (self, m):
-        if m.group (1):
-            # ^Qx or ^Rx is literally x
-            return m.group (1)
-        elif m.group (2):
-            # ^EQq is text of Q-reg q
-            return self.qregstr (m.group (2))
-        elif m.group (3):
-            # ^EUq is character whose code is in numeric Q-reg q
-            return chr (self.qreg (m.group (3)).getnum ())
-        elif m.group (4):
-            # ^Vx is lowercase x
-            return m.group (4).lower ()
-        elif m.group (5):
-            # ^Vx is uppercase x
-            return m.group (5).upper ()
-        else:
-            # ^x is control-x
-            return self.makecontrol (m.group (6))
+        # Exactly one group matches, so lastindex says which one it was
+        i = m.lastindex
+        return self._bldops[i] (self, m.group (i))
         
     def strbuild (self, s):
         """TECO string builder.  This processes uparrow/char combinations,
@@ -1405,44 +1776,39 @@ class command_level(metaclass=Anychar):
         characters such as ^Qx (literal x), ^EQq (text in q-reg q), etc.
         """
         if self.edflag & 1:
-            pat = _bldpatnoup
+            pat, chars = _bldpatnoup, _bldcharsnoup
         else:
-            pat = _bldpat
+            pat, chars = _bldpat, _bldchars
+        if chars.isdisjoint (s):
+            return s
         return pat.sub (self._strbuildrep, s)
 
     def _str2rerep (self, m):
-        if m.group (1):
-            return '\\' + m.group (1)
-        elif m.group (2):
-            return _searchdict2[m.group (2).lower ()]
+        # lastindex is the group for the construct that matched; the
+        # ^N group (3) is only ever matched along with group 4 or 5.
+        i = m.lastindex
+        g = m.group (i)
+        if i == 1:
+            return '\\' + g
+        elif i == 2:
+            return _searchdict2[g.lower ()]
+        elif i == 6:
+            # ^EE -- regexp pattern.  Return it exactly as written.
+            return g
         
         inverse = m.group (3) is not None
-        if m.group (4):
+        if i == 4:
             # ^EGq -- table match
-            charset = set (self.qregstr (m.group (4)))
-            pfx = sfx = ''
-            if not charset:
+            # re.escape quotes anything special inside a character
+            # class as well, such as ], \, - and ^.
+            chars = self.qregstr (g)
+            if not chars:
                 return ""
-            if not inverse and len (charset) == 1:
-                c = ''.join (charset)
-                if c in "][\\^$.?+(){}":
-                    c = '\\' + c
-                return c
-            if ']' in charset:
-                charset -= set (']')
-                pfx = ']'
-            if '\\' in charset:
-                charset -= set ('\\')
-                pfx += '\\'
-            if '-' in charset:
-                sfx = '-'
-                charset -= set ('-')
-            c = pfx + ''.join (charset) + sfx
-        elif m.group (5):
-            c = _searchdict5[m.group (5).lower ()]
+            if not inverse and len (set (chars)) == 1:
+                return re.escape (chars[0])
+            c = re.escape (chars)
         else:
-            # ^EE -- regexp pattern.  Return it exactly as written.
-            return m.group (6)
+            c = _searchdict5[g.lower ()]
         if inverse:
             return "[^%s]" % c
         else:
@@ -1451,11 +1817,27 @@ class command_level(metaclass=Anychar):
     def str2re (self, s):
         """Convert a TECO search string to the equivalent
         regular expression string.
+
+        A non-empty case sensitive search for plain text doesn't need a
+        regexp; for that case a literalpat is returned instead.
         """
         reflags = re.DOTALL
         if self.ctrlxflag == 0:
             reflags |= re.IGNORECASE
-        return re.compile (_searchpat.sub (self._str2rerep, s), reflags)
+        elif s and _literalstop.isdisjoint (s):
+            return literalpat (s)
+        if not _searchchars.isdisjoint (s):
+            if _searchmulti.isdisjoint (s):
+                s = s.translate (_searchtrans)
+            else:
+                s = _searchpat.sub (self._str2rerep, s)
+        key = (s, reflags)
+        pat = _searchcache.get (key)
+        if pat is None:
+            if len (_searchcache) >= _searchcachemax:
+                _searchcache.clear ()
+            pat = _searchcache[key] = re.compile (s, reflags)
+        return pat
 
     def isinteractive (self):
         '''Return True if executing at the interactive level
@@ -1546,19 +1928,25 @@ class command_level(metaclass=Anychar):
         command position.  Nested iterations are skipped (not searched),
         so if the tag is in one of those it will not be found.
         '''
+        cmd = self.command
+        # The tag text with its terminator, for the usual non-@ form
+        tagstr = c + '!'
         while True:
             tail = self.skip (tagre)
             if not tail:
                 raise TAG (self.teco, c)
             if tail == '!':
-                term = '!'
-                if self.command[self.cmdpos-2] == '@':
+                if cmd[self.cmdpos-2] == '@':
                     term = self.nextcmd ()
-                if self.command.startswith (c + term, self.cmdpos):
+                    target = c + term
+                else:
+                    term = '!'
+                    target = tagstr
+                if cmd.startswith (target, self.cmdpos):
                     self.cmdpos += len (c) + 1
                     return
                 try:
-                    e = self.command.index (term, self.cmdpos)
+                    e = cmd.index (term, self.cmdpos)
                     self.cmdpos = e + 1
                 except ValueError:
                     raise UTC (self.teco, '!')
@@ -1576,10 +1964,14 @@ class command_level(metaclass=Anychar):
         self.command = s
         self.cmdpos = 0
         self.iterstack = [ ]
+        # This is the interpreter's inner loop, so look up the length
+        # and the methods it uses just once.
+        n = len (s)
+        nextcmd = self.nextcmd
+        do = self.do
         try:
-            while self.cmdpos < len (self.command):
-                c = self.nextcmd ()
-                self.do (c)
+            while self.cmdpos < n:
+                do (nextcmd ())
         except ExitLevel:
             pass
         except KeyboardInterrupt:
@@ -1638,30 +2030,38 @@ class command_level(metaclass=Anychar):
         buf = self.buf
         while rep:
             if n < 0:
-                # This is painful.  There is no reverse search for
-                # regular expressions, so we do it the hard way,
-                # by repeatedly matching, stepping backwards one
-                # character at a time...
-                #
-                # Note to self: a different way that's probably faster
-                # but harder to do: reverse the string, reverse the
-                # regexp pattern, "unreverse" any [...] and [...]+
-                # inside the regexp, and do an ordinary search with those.
-                # Then some extra work is needed to find any matches
-                # that straddle the search start point (i.e., dot).
-                tmatch = re.match (buf, pos)
-                if tmatch and not (laststart and tmatch.end () > laststart):
-                    match = tmatch
-                    laststart = match.start ()
-                else:
-                    if pos:
-                        pos -= 1
-                        continue
-                    match = None
+                # Find the closest match before the previous one.
+                # Since the previous match started at pos, that one
+                # is found again unless it is empty, so it has to be
+                # excluded explicitly by limiting where the match ends.
+                match = rsearch (re, buf, pos, start, laststart)
+                if match:
+                    laststart = pos = match.start ()
+                    rep -= 1
             else:
-                match = re.search (buf, pos)
-            if match and not start <= match.start () <= end:
+                # Step through the successive matches, each one
+                # starting where the previous one ended, until we have
+                # the one we want or the next one starts past the end
+                # of the range.  If we run out, rep says how many more
+                # are needed on the next page.
+                #
+                # If the range is empty, as it is for ::S, the only
+                # possible match is one right at pos.  Check just for
+                # that, rather than have finditer search through the
+                # rest of the buffer for a match we'd then reject.
                 match = None
+                if pos >= end:
+                    tmatch = re.match (buf, pos) if pos == end else None
+                    matches = (tmatch, ) if tmatch else ()
+                else:
+                    matches = re.finditer (buf, pos)
+                for tmatch in matches:
+                    if tmatch.start () > end:
+                        break
+                    rep -= 1
+                    if not rep:
+                        match = tmatch
+                        break
             if match is None:
                 # If we have a nextpage function and we're not
                 # at the end of the input file, keep going
@@ -1686,7 +2086,6 @@ class command_level(metaclass=Anychar):
                     return False
                 else:
                     raise SRH (self.teco, s)
-            rep -= 1
 
         # We found what we were looking for.  "match" is a regexp
         # match object for the matched string.
@@ -1748,10 +2147,17 @@ class command_level(metaclass=Anychar):
             c = c.lower ()
         else:
             c = self.qregname ()
+        # Try the global Q-regs first.  Only valid names are ever
+        # entered there, so if it is found, no further checking is
+        # needed.
+        q = self.teco.qregs.get (c)
+        if q is not None:
+            return q
         qd = self.qdict (c)
-        if c not in qd:
-            qd[c] = qreg ()
-        return qd[c]
+        q = qd.get (c)
+        if q is None:
+            q = qd[c] = qreg ()
+        return q
 
     def qregstr (self, c = None):
         '''Return the string value of the specified Q-register,
@@ -1798,7 +2204,6 @@ class command_level(metaclass=Anychar):
         """
         s = self.strarg (c, '\001')
         sys.stdout.write (s)
-        sys.stdout.flush ()
         self.screenok = False
         self.clearargs ()
 
@@ -1809,7 +2214,7 @@ class command_level(metaclass=Anychar):
         so use the RSX/VMS format instead, which is substantially
         more Y2K-proof.
         """
-        now = time.localtime ()
+        now = localtime ()
         self.setval ((now.tm_year - 1900) * 512 + now.tm_mon * 32 + now.tm_mday)
         
     def char003 (self, c):    # ^C
@@ -1843,7 +2248,7 @@ class command_level(metaclass=Anychar):
         RSX/VMS format here, too.  Amusingly, that happens to be
         the RT-11 format, too.
         """
-        now = time.localtime ()
+        now = localtime ()
         self.setval (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec)
 
     def char011 (self, c):    # tab
@@ -1904,11 +2309,14 @@ class command_level(metaclass=Anychar):
         n = self.getoptarg (c)
         if n is None:
             self.clearmods ()
-            if (self.etflag & 32) and self.teco.cmdhandler.eifile is None:
+            cmdhandler = self.teco.cmdhandler
+            if (self.etflag & 32) and cmdhandler.eifile is None:
                 # TODO -- nowait char fetch from terminal
                 n = -1
             else:
-                n = ord (self.teco.cmdhandler.getch ())
+                # Make sure any prompt has been sent before waiting
+                sys.stdout.flush ()
+                n = ord (cmdhandler.getch ())
             self.setval (n)
         else:
             self.clearargs ()
@@ -1917,7 +2325,6 @@ class command_level(metaclass=Anychar):
             else:
                 sys.stdout.write (printable (chr (n)))
             self.screenok = False
-            sys.stdout.flush ()
 
     def char025 (self, c):    # ^U
         """^U command -- set Q-reg text.
@@ -1982,34 +2389,10 @@ class command_level(metaclass=Anychar):
         '''" command -- conditional execution range start.
         '''
         n = self.getarg (c, NAQ)
-        if 0 <= n < 0x110000:
-            nc = chr (n)
-        else:
-            nc = ""
-        c = self.nextcmd ().lower ()
-        if c == 'a':
-            cond = nc.isalpha ()
-        elif c == 'c':
-            cond = nc.isalnum () or nc in "$._"
-        elif c == 'd':
-            cond = nc.isdigit ()
-        elif c in "efu=":
-            cond = n == 0
-        elif c in "g>":
-            cond = n > 0
-        elif c in "lst<":
-            cond = n < 0
-        elif c in "n":
-            cond = n != 0
-        elif c == 'r':
-            cond = nc.isalnum ()
-        elif c == 'v':
-            cond = nc.islower ()
-        elif c == 'w':
-            cond = nc.isupper ()
-        else:
+        test = condtests.get (self.nextcmd ().lower ())
+        if test is None:
             raise IQC (self.teco)
-        if not cond:
+        if not test (n):
             self.skipcond ("|'")
             self.tracechar (self.command[self.cmdpos - 1])
         
@@ -2021,8 +2404,8 @@ class command_level(metaclass=Anychar):
         if n is None:
             n = 1
         q = self.qreg ()
-        n += q.getnum ()
-        q.setnum (n)
+        n += q.num
+        q.num = n
         self.setval (n)
 
     def char047 (self, c):    # '
@@ -2074,8 +2457,22 @@ class command_level(metaclass=Anychar):
         """Digits are handled by this method.  All digit methods are
         bound to this method, and distinguished by the command
         character argument.
-        """
-        self.teco.digit (c)
+
+        Any digits that follow are taken in here as well, rather than
+        each being dispatched as a separate command.  In octal the run
+        stops at an 8 or 9, so that the error for it is reported when
+        that digit is reached.
+        """
+        teco = self.teco
+        teco.digit (c)
+        cmd = self.command
+        pos = self.cmdpos
+        end = digitruns[teco.radix].match (cmd, pos).end ()
+        if end > pos:
+            self.tracechar (cmd[pos:end])
+            self.cmdpos = end
+            radix = teco.radix
+            teco.num = teco.num * radix ** (end - pos) + int (cmd[pos:end], radix)
 
     char060 = digit
     char061 = digit
@@ -2142,7 +2539,6 @@ class command_level(metaclass=Anychar):
         else:
             sys.stdout.write ("%d%s" % (n, term))
         self.screenok = False
-        sys.stdout.flush ()
         
     def char076 (self, c):    # >
         """< command -- iteration end.
@@ -2174,9 +2570,10 @@ class command_level(metaclass=Anychar):
             if colon:
                 self.setval (ret)
         else:
+            buf = self.buf
             pos = self.dot + n
-            if 0 <= pos < self.end:
-                self.setval (ord (self.buf[pos]))
+            if 0 <= pos < len (buf):
+                self.setval (ord (buf[pos]))
             else:
                 self.setval (-1)
     
@@ -2188,9 +2585,11 @@ class command_level(metaclass=Anychar):
     def c (self, c):
         """C command -- move forward n characters.
         """
-        newpos = self.dot + self.getarg (c, 1)
-        if 0 <= newpos <= self.end:
-            self.buffer.goto (newpos)
+        buffer = self.buffer
+        newpos = buffer.dot + self.getarg (c, 1)
+        # Already range checked, so there's no need for goto
+        if 0 <= newpos <= buffer.end:
+            buffer.dot = newpos
         else:
             raise POP (self.teco, c)
         
@@ -2200,20 +2599,22 @@ class command_level(metaclass=Anychar):
         """
         # TODO: two args
         m, n = self.getargs (c, 1)
+        buffer = self.buffer
+        bufend = buffer.end
         if m is None:
-            end = self.dot + n
-            if 0 <= end <= self.end:
+            end = buffer.dot + n
+            if 0 <= end <= bufend:
                 if n < 0:
-                    self.buffer.goto (end)
+                    buffer.goto (end)
                     n = -n
                 if n:
-                    self.buffer.delete (n)
+                    buffer.delete (n)
             else:
                 raise POP (self.teco, c)
         else:
-            if 0 <= m <= n <= self.end:
-                self.buffer.goto (m)
-                self.buffer.delete (n - m)
+            if 0 <= m <= n <= bufend:
+                buffer.goto (m)
+                buffer.delete (n - m)
             else:
                 raise POP (self.teco, c)
         self.clearmods ()
@@ -2222,10 +2623,13 @@ class command_level(metaclass=Anychar):
         """E command -- two character command starting with E.
         """
         c = self.nextcmd ()
-        try:
-            self.do ('e' + c)
-        except ILL:
+        # Look up the handler here rather than using do, so an ILL
+        # error from inside the command isn't taken for a bad name.
+        name = 'e' + c.lower ()
+        op = self.commands.get (name)
+        if op is None:
             raise IEC (self.teco, c)
+        op (self, name)
 
     def ea (self, c):
         """EA command -- switch to alternate output stream.
@@ -2311,15 +2715,15 @@ class command_level(metaclass=Anychar):
         cmd = self.strbuild (self.strarg (c))
         colon = self.colon ()
         if len (cmd):
-            self.enlist = glob.glob (cmd)
+            self.enlist = glob.iglob (cmd)
             self.enstring = cmd
-        elif self.enlist:
-            self.lastfilename = self.enlist[0]
-            del self.enlist[0]
-            if colon:
-                self.setval (-1)
         else:
-            if colon:
+            name = self.enlist and next (self.enlist, None)
+            if name is not None:
+                self.lastfilename = name
+                if colon:
+                    self.setval (-1)
+            elif colon:
                 self.setval (0)
             else:
                 raise FNF (self.teco, self.enstring)
@@ -2383,10 +2787,12 @@ class command_level(metaclass=Anychar):
         """F command -- two character command starting with F.
         """
         c = self.nextcmd ()
-        try:
-            self.do ('f' + c)
-        except ILL:
+        # Handler lookup is done here, as for E commands.
+        name = 'f' + c.lower ()
+        op = self.commands.get (name)
+        if op is None:
             raise IFC (self.teco, c)
+        op (self, name)
 
     def fchar047 (self, c):    # f'
         """F' command -- 'flow' to end of conditional.
@@ -2441,18 +2847,14 @@ class command_level(metaclass=Anychar):
             count = -1
             m, n = n, m
         if self.search (s, count, m, n, colon, False):
-            self.buffer.goto (self.dot + self.laststringlen)
-            self.buffer.delete (-self.laststringlen)
-            self.buffer.insert (rep)
+            self.buffer.replace (rep)
 
     def fr (self, c):
         """FR command -- replace string previously matched or
         inserted with the specified string.
         """
         rep = self.strarg (c)
-        self.buffer.goto (self.dot + self.laststringlen)
-        self.buffer.delete (-self.laststringlen)
-        self.buffer.insert (rep)
+        self.buffer.replace (rep)
         
     def fs (self, c):
         """FS command -- search and replace.
@@ -2483,9 +2885,7 @@ class command_level(metaclass=Anychar):
         elif c == "f_":
             nextpage = self.y
         if self.search (s, n, start, end, colon, topiffail, nextpage):
-            self.buffer.goto (self.dot + self.laststringlen)
-            self.buffer.delete (-self.laststringlen)
-            self.buffer.insert (rep)
+            self.buffer.replace (rep)
         
     fn = fs
     fchar137 = fs              # f_
@@ -2507,7 +2907,6 @@ class command_level(metaclass=Anychar):
         s = self.qregstr ()
         if self.colon ():
             sys.stdout.write (s)
-            sys.stdout.flush ()
             self.screenok = False
         else:
             self.buffer.insert (s)
@@ -2546,8 +2945,9 @@ class command_level(metaclass=Anychar):
         delete the range of characters between those two positions.
         """
         m, n = self.teco.lineargs (c)
-        self.buffer.goto (m)
-        self.buffer.delete (n - m)
+        buffer = self.buffer
+        buffer.goto (m)
+        buffer.delete (n - m)
         self.clearargs ()
         
     def l (self, c):
@@ -2645,15 +3045,16 @@ class command_level(metaclass=Anychar):
             self.setval (n)
         else:
             self.clearmods ()
-            self.setval (q.getnum ())
+            self.setval (q.num)
         
     def r (self, c):
         """R command -- move backward by the specified number of
         character positions.
         """
-        newpos = self.dot - self.getarg (c, 1)
-        if 0 <= newpos <= self.end:
-            self.buffer.goto (newpos)
+        buffer = self.buffer
+        newpos = buffer.dot - self.getarg (c, 1)
+        if 0 <= newpos <= buffer.end:
+            buffer.dot = newpos
         else:
             raise POP (self.teco, c)
 
@@ -2700,7 +3101,6 @@ class command_level(metaclass=Anychar):
         """
         m, n = self.teco.lineargs (c)
         sys.stdout.write (printable (self.buf[m:n]))
-        sys.stdout.flush ()
         self.screenok = False
         self.clearargs ()
         
@@ -2709,7 +3109,7 @@ class command_level(metaclass=Anychar):
         to the specified value.
         """
         q = self.qreg ()
-        q.setnum (self.getarg (c, NAU))
+        q.num = self.getarg (c, NAU)
         
     def v (self, c):
         """V command -- display the current line, with n lines to each
@@ -2720,7 +3120,6 @@ class command_level(metaclass=Anychar):
         start = self.buffer.line (1 - (m or n))
         end = self.buffer.line (n)
         sys.stdout.write (printable (self.buf[start:end]))
-        sys.stdout.flush ()
         self.teco.screenok = False
 
     def w (self, c):
@@ -2752,9 +3151,19 @@ class command_level(metaclass=Anychar):
                     # insert until...
                     if not n & 1:
                         self.teco.watch ()
-                    term = m and [ m & 255, m >> 8 ]
-                    if n & 2:
-                        m.append (9)
+                    # Work out once which characters are inserted;
+                    # anything else ends the input.  That is tab and
+                    # the printable ASCII characters, less the
+                    # terminators given in m and tab if the 2 bit is
+                    # set, or nothing at all if the 64 bit is set.
+                    if n & 64:
+                        accept = frozenset ()
+                    else:
+                        term = [ m & 255, m >> 8 ] if m else [ ]
+                        if n & 2:
+                            term.append (9)
+                        accept = frozenset ([ 9 ] + list (range (32, 127)))
+                        accept = accept.difference (term)
                     while True:
                         ch = screen.getch ()
                         if ch == 3:
@@ -2762,9 +3171,7 @@ class command_level(metaclass=Anychar):
                                 self.etflag &= -32768
                             else:
                                 raise XAB (self.teco)
-                        if (n & 64) or \
-                               (ch != 9 and ch < 32) or ch > 126 or \
-                               (term and ch in term):
+                        if ch not in accept:
                             break
                         c = chr (ch)
                         if n & 4:
@@ -2834,8 +3241,8 @@ class command_level(metaclass=Anychar):
         """
         # We have to make a copy of the Q register so that any later
         # changes to the existing one are not also reflected in the
-        # pushed copy.  A shallow copy suffices.
-        self.teco.qstack.append (copy.copy (self.qreg ()))
+        # pushed copy.
+        self.teco.qstack.append (self.qreg ().copy ())
 
     def char134 (self, c):    # \
         r"""\ command -- number/string conversion.
@@ -2851,12 +3258,7 @@ class command_level(metaclass=Anychar):
         n = self.getoptarg (c)
         if n is None:
             self.clearmods ()
-            if self.radix == 8:
-                m = octre.match (self.buf, self.dot)
-            elif self.radix == 10:
-                m = decre.match (self.buf, self.dot)
-            else:
-                m = hexre.match (self.buf, self.dot)
+            m = radixre[self.radix].match (self.buf, self.dot)
             if m is None:
                 n = 0
             else:
@@ -2865,13 +3267,7 @@ class command_level(metaclass=Anychar):
             self.setval (n)
         else:
             self.clearargs ()
-            if self.radix == 8:
-                s = "%o" % n
-            elif self.radix == 10:
-                s = "%d" % n
-            else:
-                s = "%x" % n
-            self.buffer.insert (s)
+            self.buffer.insert (radixfmt[self.radix] % n)
 
     def char135 (self, c):    # ]
         """] command -- pop the Q-register stack into the specified
@@ -2904,7 +3300,10 @@ class command_level(metaclass=Anychar):
 class inputstream (object):
     def __init__ (self, teco):
         self.teco = teco
-        self.pages = ""
+        # The file data, and the position of the next page in it,
+        # or None if all pages have been read.
+        self.data = ""
+        self.pos = None
         self.eoflag = -1
         self.ffflag = 0
         self.infile = False
@@ -2926,23 +3325,33 @@ class inputstream (object):
         except IOError:
             raise INP (self.teco)
         infile.close ()
-        self.pages = indata.split (ff)
+        self.data = indata
+        self.pos = 0
         self.infile = True                 # input file is "open"
         self.infn = fn
         self.eoflag = 0
         return -1
 
     def readpage (self):
-        if self.pages:
-            ret = self.pages[0].replace (lf, crlf)
-            del self.pages[0]
-            if len (self.pages):
+        # Pages are cut out of the file data as they are read, rather
+        # than splitting it all up front, so there is only one copy
+        # of the whole file.
+        pos = self.pos
+        if pos is not None:
+            data = self.data
+            end = data.find (ff, pos)
+            if end >= 0:
+                ret = data[pos:end]
+                self.pos = end + 1
                 self.ffflag = -1
                 self.eoflag = 0
             else:
+                ret = data[pos:]
+                self.data = ""
+                self.pos = None
                 self.ffflag = 0
                 self.eoflag = -1
-            return ret, -1
+            return ret.replace (lf, crlf), -1
         else:
             self.ffflag = 0
             self.eoflag = -1
@@ -2973,11 +3382,33 @@ class outputstream (object):
         self.outfn = fn
         return -1
     
+# Where EI last found each file given without a directory, keyed by
+# the search path and the file name
+eipaths = { }
+# Size of the blocks of text that buffer.line skips over at a time
+lineblock = 16384
+# Size of the blocks in which buffer.writepage writes the text
+writeblock = 1 << 20
+
 class buffer (object):
     '''This class defines the TECO text buffer, and methods to manipulate
     its contents.
+
+    The text is a Python (Unicode) string, not a bytearray, since
+    buffer positions are character positions and the buffer may
+    hold any Unicode character.
+
+    Text inserted at dot is collected in the "gap": a list of the
+    position, the pieces of text inserted there, and their total
+    length.  It is merged into the buffer text only when the text is
+    next needed, so a series of inserts (as done by a macro that
+    builds up text) doesn't copy the whole buffer for each one.
+    Since reading the text changes the buffer, the merge and the
+    inserts are done under a lock: the display thread reads the text
+    while the interpreter thread is inserting.
     '''
     def __init__ (self, teco):
+        self.lock = threading.RLock ()
         self.text = ""
         self.dot = 0
         self.teco = teco
@@ -2988,25 +3419,64 @@ class buffer (object):
         self.ostream = 0
 
     laststringlen = commonprop ("laststringlen")
+
+    def _gettext (self):
+        with self.lock:
+            gap = self.gap
+            if gap:
+                pos, pieces, n = gap
+                text = self._text
+                self._text = "".join ([ text[:pos] ] + pieces + [ text[pos:] ])
+                self.gap = None
+            return self._text
+
+    def _settext (self, text):
+        # The length is kept in "end", since it is asked for a lot
+        with self.lock:
+            self._text = text
+            self.gap = None
+            self.end = len (text)
+
+    text = property (_gettext, _settext)
     
+    def _addtext (self, pos, text):
+        with self.lock:
+            gap = self.gap
+            if not gap or pos != gap[0] + gap[2]:
+                # Not continuing the previous insert, so merge that one
+                # and start a new gap here.
+                self._gettext ()
+                gap = self.gap = [ pos, [ ], 0 ]
+            gap[1].append (text)
+            gap[2] += len (text)
+            self.end += len (text)
+
     def insert (self, text):
-        self.text = self.text[:self.dot] + text + self.text[self.dot:]
+        self._addtext (self.dot, text)
         self.dot += len (text)
         self.laststringlen = -len (text)
 
     def delete (self, len):
         self.text = self.text[:self.dot] + self.text[self.dot + len:]
 
+    def replace (self, text):
+        """Replace the string last inserted or found (as given by
+        laststringlen) with the supplied text.  This is the same as
+        moving back over that string, deleting it, and inserting the
+        new text, but builds the new buffer text only once.
+        """
+        oldlen = -self.laststringlen
+        pos = min (max (self.dot - oldlen, 0), len (self.text))
+        self.text = self.text[:pos] + text + self.text[pos + oldlen:]
+        self.dot = pos + len (text)
+        self.laststringlen = -len (text)
+
     def goto (self, pos):
         if pos < 0: pos = 0
-        if pos > len (self.text): pos = len (self.text)
+        end = self.end
+        if pos > end: pos = end
         self.dot = pos
-            
-    def _end (self):
-        return len (self.text)
 
-    end = property (_end)
-    
     def _ffflag (self):
         infile = self.inputs[self.istream]
         if infile:
@@ -3026,19 +3496,41 @@ class buffer (object):
     eoflag = property (_eoflag)
     
     def line (self, linecnt):
+        """Return the buffer position "linecnt" lines away from dot,
+        as for the L command.
+        """
+        text = self.text
         pos = self.dot
+        # For a move across many lines, first skip over whole blocks
+        # of text that have fewer line ends than we still need, letting
+        # str.count do the counting.  The last few lines are then found
+        # one at a time.
         if linecnt > 0:
+            while linecnt > 64:
+                nxt = pos + lineblock
+                n = text.count (lf, pos, nxt)
+                if n >= linecnt or nxt >= len (text):
+                    break
+                linecnt -= n
+                pos = nxt
             while linecnt > 0:
                 try:
-                    pos = self.text.index (lf, pos) + 1
+                    pos = text.index (lf, pos) + 1
                 except ValueError:
-                    return len (self.text)
+                    return len (text)
                 linecnt -= 1
             return pos
         else:
+            while linecnt < -64:
+                prev = max (pos - lineblock, 0)
+                n = text.count (lf, prev, pos)
+                if n > -linecnt or prev == 0:
+                    break
+                linecnt += n
+                pos = prev
             while linecnt <= 0:
                 try:
-                    pos = self.text.rindex (lf, 0, pos)
+                    pos = text.rindex (lf, 0, pos)
                 except ValueError:
                     return 0
                 linecnt += 1
@@ -3099,8 +3591,8 @@ class buffer (object):
         self.istream = 1
         
     def er (self, fn, colon):
-        """ This opens an input file, reads the whole file, and breaks it
-        into pages.
+        """ This opens an input file and reads the whole file; pages
+        are then taken from it as they are needed.
         I suppose that isn't really all that elegant, but unless the
         file is humongous, it's fast enough these days, and it produces
         the correct result.
@@ -3145,18 +3637,33 @@ class buffer (object):
         if not infile:
             raise NFI (self.teco)
         newstr, ret = infile.readpage ()
-        self.text += newstr
+        # This goes through the gap like an insert at the end, so
+        # appending page after page doesn't copy the buffer each time.
+        if newstr:
+            self._addtext (self.end, newstr)
         return ret
 
     def writepage (self, part = None):
         outfile = self.outputs[self.ostream]
         if not outfile:
             raise NFO (self.teco)
+        text = self.text
         if part:
-            start, end = part
-            outfile.outfile.write (self.text[start:end].replace (crlf, lf))
+            # Same range as text[start:end] would give
+            start, end, i = slice (*part).indices (len (text))
         else:
-            outfile.outfile.write (self.text.replace (crlf, lf))
+            start, end = 0, len (text)
+        # Convert the line ends and write the text a block at a time,
+        # so a large buffer isn't copied whole to do the conversion.
+        # A CR at the end of a block is left for the next one, in
+        # case it is followed by LF.
+        write = outfile.outfile.write
+        while start < end:
+            stop = min (start + writeblock, end)
+            if stop < end and text[stop - 1] == cr:
+                stop -= 1
+            write (text[start:stop].replace (crlf, lf))
+            start = stop
             
     def page (self):
         """Write out the current page, and read the next.
@@ -3198,20 +3705,34 @@ class command_handler (object):
                 self.eifile.close ()
             f = None
             if not os.path.dirname (fn):
-                fn
-                for d in (os.environ.get("TECO_PATH",None) or
-                          os.environ.get("PATH",None) or
-                          os.defpath).split(os.pathsep):
-                    realfn = os.path.join (d, fn)
+                path = (os.environ.get("TECO_PATH",None) or
+                        os.environ.get("PATH",None) or
+                        os.defpath)
+                # Try where the file was found last time first
+                key = (path, fn)
+                realfn = eipaths.get (key)
+                if realfn:
                     try:
                         f = open (realfn, "r", encoding = "utf8",
                                   errors = "ignore")
-                        break
                     except IOError as err:
                         if err.errno == 2:
-                            pass
+                            del eipaths[key]
                         else:
                             raise FER (self.teco)
+                if not f:
+                    for d in path.split(os.pathsep):
+                        realfn = os.path.join (d, fn)
+                        try:
+                            f = open (realfn, "r", encoding = "utf8",
+                                      errors = "ignore")
+                            eipaths[key] = realfn
+                            break
+                        except IOError as err:
+                            if err.errno == 2:
+                                pass
+                            else:
+                                raise FER (self.teco)
             else:
                 try:
                     f = open (fn, "r", encoding = "utf8", errors = "ignore")
@@ -3272,7 +3793,10 @@ class command_handler (object):
         and rubout are processed.  Double control/G exits with a null
         command (which will cause the main loop to prompt again).
         '''
-        buf = ""
+        # The text is accumulated one character per list element,
+        # which avoids copying the whole string for every character
+        # read.  That matters for long EI files.
+        buf = [ ]
         bellflag = False
         escflag = False
         immediate = True
@@ -3290,7 +3814,7 @@ class command_handler (object):
                         if c.isalnum ():
                             print()
                             return '*' + c
-                        buf = '*'
+                        buf = [ '*' ]
                     immediate = False
                 if c == bell:
                     if bellflag:
@@ -3300,51 +3824,46 @@ class command_handler (object):
                 elif bellflag:
                     bellflag = False
                     if c == ' ':
-                        buf = buf[:-1]
-                        try:
-                            start = buf.rindex (lf)
-                        except ValueError:
-                            start = 0
+                        del buf[-1]
+                        text = "".join (buf)
+                        start = max (text.rfind (lf), 0)
                         print()
-                        sys.stdout.write (printable (buf[start:]))
+                        sys.stdout.write (printable (text[start:]))
                         sys.stdout.flush ()
                         continue
                     elif c == '*':
-                        buf = buf[:-1]
+                        del buf[-1]
                         print()
-                        sys.stdout.write (printable (buf))
+                        sys.stdout.write (printable ("".join (buf)))
                         sys.stdout.flush ()
                         continue
                 if c == ctrlu:
                     print()
-                    try:
-                        ls = buf.rindex (lf)
-                        buf = buf[:ls + 1]
-                    except ValueError:
-                        buf = ""
+                    ls = "".join (buf).rfind (lf)
+                    del buf[ls + 1:]
                     continue
                 elif c == rubchr:
                     if len (buf):
                         sys.stdout.write ("\010 \010")
                         if ord (buf[-1]) < 32 and buf[-1] != esc:
                             sys.stdout.write ("\010 \010")
-                        buf = buf[:-1]
+                        del buf[-1]
                         sys.stdout.flush ()
                     continue
             if c == esc:
-                buf += c
+                buf.append (c)
                 if escflag:
                     if not self.eifile:
                         print()
-                    return buf
+                    return "".join (buf)
                 escflag = True
                 continue
             else:
                 escflag = False
             if c == cr:
-                buf += crlf
+                buf.extend (crlf)
             else:
-                buf += c
+                buf.append (c)
 
 # Here's a rather primitive (but functional) teco command handler.
 # This one is used if we can't find a teco.tec anywhere.